@@ -0,0 +1,28 @@
+from cachetools import TTLCache
+
+from src.config import settings
+
+
+# Analytics responses keyed by (endpoint, user_name, from_dt).
+# The cache is per process: with web_concurrency > 1 every worker keeps its own copy.
+analytics_cache = TTLCache(maxsize=settings.analytics_cache_size, ttl=settings.analytics_cache_ttl)
+
+# Bumped on every invalidation; a result computed across a bump is not stored.
+# Only invalidate_user writes here, so lookups for unknown users add no entries.
+user_generations = {}
+
+
+def get_generation(user_name: str) -> int:
+    return user_generations.get(user_name, 0)
+
+
+def cache_store(key, generation: int, content):
+    if get_generation(key[1]) == generation:
+        analytics_cache[key] = content
+    return content
+
+
+def invalidate_user(user_name: str):
+    user_generations[user_name] = get_generation(user_name) + 1
+    for key in [_ for _ in analytics_cache.keys() if _[1] == user_name]:
+        analytics_cache.pop(key, None)
@@ -1,20 +1,19 @@
+import math
 from typing import List, Literal, Dict
 from datetime import datetime
 from collections import defaultdict
 
+from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from logging import getLogger
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pymongo.errors import DuplicateKeyError
 
 from src.db import get_db
 from src.context import get_request_id
-from src.bill.views import get_bills, get_bill
-from src.bill.schemas import GetBillResponse, SpecificationItem
-
-from src.cost.views import get_costs
-from src.cost.schemas import CostDocument
 
+from .cache import analytics_cache, get_generation, cache_store
 from .schemas import (
     CompanyTotal,
     ItemTotal,
@@ -28,32 +27,101 @@ log = getLogger(__name__)
 
 router = APIRouter()
 
+# Only the fields process_bills reads; documents stay raw dicts on this path.
+BILL_ANALYTICS_PROJECTION = {
+    "_id": 0,
+    "items.name": 1,
+    "items.total": 1,
+    "seller_info.company": 1,
+}
+
 
-def process_bill_items(items: List[SpecificationItem], total_by_item) -> float:
-    total = 0.0
+def process_bill_items(items: List[Dict], total_by_item) -> float:
+    bill_total = 0.0
     for item in items:
-        total += item.total
-        total_by_item[item.name] += item.total
+        total = item["total"]
+        total_by_item[item["name"]] += total
+        bill_total += total
 
-    return total
+    return bill_total
 
 
-def process_bills(bills: List[GetBillResponse]) -> GetAnalyticsResponse:
+def process_bills(bills: List[Dict]) -> GetAnalyticsResponse:
     total_by_seller = defaultdict(float)
     total_by_item = defaultdict(float)
     bills_total = 0.0
     for bill in bills:
-        bill_total = process_bill_items(bill.items, total_by_item)
+        bill_total = process_bill_items(bill["items"], total_by_item)
         bills_total += bill_total
-        total_by_seller[bill.seller_info.company] += bill_total
+        total_by_seller[bill["seller_info"]["company"]] += bill_total
 
-    return GetAnalyticsResponse(
+    return GetAnalyticsResponse.model_construct(
         total=bills_total,
-        companies=[CompanyTotal(name=k, total=v) for k, v in total_by_seller.items()],
-        items=[ItemTotal(name=k, total=v) for k, v in total_by_item.items()],
+        companies=[CompanyTotal.model_construct(name=k, total=v) for k, v in total_by_seller.items()],
+        items=[ItemTotal.model_construct(name=k, total=v) for k, v in total_by_item.items()],
+    )
+
+
+def _match_query(user_name: str, from_dt: datetime | None) -> Dict:
+    query = {"user_name": user_name}
+    if from_dt:
+        query["dt"] = {"$gte": from_dt}
+    return query
+
+
+async def get_analytics_aggregated(
+    db: AsyncIOMotorDatabase,
+    user_name: str,
+    from_dt: datetime | None
+) -> GetAnalyticsResponse:
+    pipeline = [
+        {"$match": _match_query(user_name, from_dt)},
+        {"$unwind": "$items"},
+        {
+            "$facet": {
+                "companies": [
+                    {"$group": {"_id": "$seller_info.company", "total": {"$sum": "$items.total"}}}
+                ],
+                "items": [
+                    {"$group": {"_id": "$items.name", "total": {"$sum": "$items.total"}}}
+                ],
+            }
+        },
+    ]
+    documents = await db["bill"].aggregate(pipeline).to_list()
+    facets = documents[0] if documents else {"companies": [], "items": []}
+
+    companies = [CompanyTotal.model_construct(name=_["_id"], total=_["total"]) for _ in facets["companies"]]
+    items = [ItemTotal.model_construct(name=_["_id"], total=_["total"]) for _ in facets["items"]]
+
+    return GetAnalyticsResponse.model_construct(
+        total=math.fsum(_.total for _ in companies),
+        companies=companies,
+        items=items,
     )
 
 
+async def get_categories_aggregated(
+    db: AsyncIOMotorDatabase,
+    user_name: str,
+    from_dt: datetime | None
+) -> ByCategoriesResponse:
+    query = _match_query(user_name, from_dt)
+    pipeline = [
+        {"$match": query},
+        {"$unionWith": {"coll": "cost", "pipeline": [{"$match": query}]}},
+        # Documents with no items still list their category, with a zero total.
+        {"$unwind": {"path": "$items", "preserveNullAndEmptyArrays": True}},
+        # Documents stored without a category fall back to the schema default.
+        {"$group": {"_id": {"$ifNull": ["$category", "Other"]}, "total": {"$sum": "$items.total"}}},
+        {"$sort": {"total": -1}},
+    ]
+    documents = await db["bill"].aggregate(pipeline).to_list()
+
+    categories = [ByCategory.model_construct(category=_["_id"], total=_["total"]) for _ in documents]
+    return ByCategoriesResponse.model_construct(total=math.fsum(_.total for _ in categories), categories=categories)
+
+
 @router.get("", response_model=GetAnalyticsResponse)
 async def get_bills_analytics(
     user_name: str = "unknown",
@@ -63,29 +131,19 @@ async def get_bills_analytics(
     request_id: str = Depends(get_request_id)
 ):
     if bill_id is not None:
-        bill = await get_bill(bill_id, db=db, request_id=request_id)
-        bills = [bill]
-        # costs = []
-    else:
-        bills = await get_bills(user_name, from_dt, db=db, request_id=request_id)
-        # costs = await get_costs(user_name, from_dt, db=db, request_id=request_id)
-
-    return process_bills(bills)
+        bill = await db["bill"].find_one({"_id": ObjectId(bill_id)}, BILL_ANALYTICS_PROJECTION)
+        if not bill:
+            raise HTTPException(status_code=404, detail="Bill not found.")
+        return ORJSONResponse(process_bills([bill]).model_dump())
 
+    key = ("analytics", user_name, from_dt)
+    content = analytics_cache.get(key)
+    if content is None:
+        generation = get_generation(user_name)
+        analytics = await get_analytics_aggregated(db, user_name, from_dt)
+        content = cache_store(key, generation, analytics.model_dump())
 
-def _process_items_by_categories(items: List[GetBillResponse | CostDocument]) -> ByCategoriesResponse:
-    total_by_categories = defaultdict(float)
-    total = 0.0
-    for item in items:
-        items_total = sum([_.total for _ in item.items])
-        total_by_categories[item.category] += items_total
-        total += items_total
-    categories = sorted(
-        [ByCategory(category=k, total=v) for k, v in total_by_categories.items()],
-        key=lambda x: x.total,
-        reverse=True
-    )
-    return ByCategoriesResponse(total=total, categories=categories)
+    return ORJSONResponse(content)
 
 
 @router.get("/by-categories", response_model=ByCategoriesResponse)
@@ -95,6 +153,11 @@ async def get_analytics_by_categories(
     db: AsyncIOMotorDatabase=Depends(get_db),
     request_id: str = Depends(get_request_id)
 ):
-    bills = await get_bills(user_name, from_dt, db=db, request_id=request_id)
-    costs = await get_costs(user_name, from_dt, db=db, request_id=request_id)
-    return _process_items_by_categories(bills+costs)
+    key = ("by-categories", user_name, from_dt)
+    content = analytics_cache.get(key)
+    if content is None:
+        generation = get_generation(user_name)
+        by_categories = await get_categories_aggregated(db, user_name, from_dt)
+        content = cache_store(key, generation, by_categories.model_dump())
+
+    return ORJSONResponse(content)
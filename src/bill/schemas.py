@@ -15,10 +15,11 @@ class UploadBillRequest(QrUrlRequest):
     category: str = "Other"
 
 
-class UploadBillResponse(RacunBase):
-    upserted_id: str | None = None
-
-
 class GetBillResponse(UploadBillRequest):
     bill_id: str
     user_name: str
+
+
+class UploadBillResponse(RacunBase):
+    upserted_id: str | None = None
+    bill: GetBillResponse | None = None
@@ -0,0 +1,43 @@
+from typing import Dict
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from .schemas import GetBillResponse
+
+
+async def get_bill_facets(
+    db: AsyncIOMotorDatabase,
+    user_name: str,
+    image_name: str | None = None,
+    qr_url: str | None = None
+) -> Dict[str, GetBillResponse | None]:
+    """
+    Look bills up by image_name and/or qr_url in one round trip.
+
+    For every given key returns the user's own bill ("user_image", "user_qr")
+    and a bill of any user ("shared_image", "shared_qr"), or None.
+    The leading $match narrows the input via the (image_name, ...) and (qr_url, ...)
+    indexes, since $facet sub-pipelines cannot use indexes themselves.
+    """
+    lookups = {}
+    if image_name is not None:
+        lookups["image"] = {"image_name": image_name}
+    if qr_url is not None:
+        lookups["qr"] = {"qr_url": qr_url}
+
+    facets = {}
+    for name, query in lookups.items():
+        facets[f"user_{name}"] = [{"$match": {**query, "user_name": user_name}}, {"$limit": 1}]
+        facets[f"shared_{name}"] = [{"$match": query}, {"$limit": 1}]
+
+    pipeline = [
+        {"$match": {"$or": list(lookups.values())}},
+        {"$facet": facets},
+    ]
+    documents = await db["bill"].aggregate(pipeline).to_list()
+
+    # $facet always produces exactly one document
+    return {
+        name: GetBillResponse(bill_id=str(found[0]["_id"]), **found[0]) if found else None
+        for name, found in documents[0].items()
+    }
@@ -5,7 +5,10 @@ from bson import ObjectId
 from fastapi import APIRouter, Depends
 from logging import getLogger
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 
+from src.config import settings
+from src.analytics.cache import invalidate_user
 from src.db import get_db
 from src.context import get_request_id
 
@@ -28,8 +31,9 @@ async def upload_bill(
     db: AsyncIOMotorDatabase=Depends(get_db),
     request_id: str = Depends(get_request_id)
 ):
-    document = bill.model_dump(mode="json")
-    document["dt"] = bill.dt
+    # Native types go straight to BSON; only HttpUrl has no BSON encoding.
+    document = bill.model_dump(mode="python")
+    document["qr_url"] = str(bill.qr_url)
     document["user_name"] = user_name
 
     collection = db["bill"]
@@ -40,21 +44,25 @@ async def upload_bill(
             {"user_name": document["user_name"]}
         ]
     }
-    result = await collection.replace_one(
+    # Return the stored document, so callers need no follow-up get_bill.
+    document = await collection.find_one_and_replace(
         filter_query,
         document,
-        upsert=True
+        upsert=True,
+        return_document=ReturnDocument.AFTER
     )
+    invalidate_user(user_name)
 
     log.info(
         f"Request ID: [{request_id}] "
         f"bill successfully uploaded"
     )
 
-    if result.upserted_id:
-        return UploadBillResponse(upserted_id=str(result.upserted_id))
-
-    return UploadBillResponse()
+    bill_id = str(document.pop("_id"))
+    return UploadBillResponse(
+        upserted_id=bill_id,
+        bill=GetBillResponse(bill_id=bill_id, **document)
+    )
 
 
 @router.get("/one", response_model=GetBillResponse | None)
@@ -95,6 +103,7 @@ async def delete_bill(
     collection = db["bill"]
 
     result = await collection.delete_one(query)
+    invalidate_user(user_name)
 
     log.info(
         f"Request ID: [{request_id}] "
@@ -117,7 +126,7 @@ async def get_bills(
     query = {"user_name": user_name}
     if from_dt:
         query["dt"] = {"$gte": from_dt}
-    cursor = collection.find(query).sort("dt", int(sort_dt))
-    documents = await cursor.to_list()
+    cursor = collection.find(query).sort("dt", int(sort_dt)).batch_size(settings.mongo_batch_size)
+    documents = await cursor.to_list(length=settings.mongo_max_documents)
 
     return [GetBillResponse(bill_id=str(_["_id"]), **_) for _ in documents]
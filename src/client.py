@@ -10,7 +10,11 @@ log = getLogger(__name__)
 
 @asynccontextmanager
 async def client_lifespan(app: FastAPI):
-    app.async_client = httpx.AsyncClient(timeout=10)
+    app.async_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(10.0, connect=3.0),
+        http2=True,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=50, keepalive_expiry=30.0),
+    )
 
     log.info("Created async client.")
 
@@ -12,9 +12,18 @@ class Settings(BaseSettings):
 
     mongo_dsn: MongoDsn
     mongo_db_name: str
+    mongo_batch_size: int = 500
+    mongo_max_documents: int = 10_000
 
     web_concurrency: int = 1
 
+    analytics_cache_ttl: float = 5.0
+    analytics_cache_size: int = 1024
+
+    specifications_cache_ttl: float = 86400.0
+    specifications_cache_size: int = 10_000
+    specifications_negative_cache_ttl: float = 60.0
+
     class Config:
         env_file = "../api.env"
         env_file_encoding = "utf-8"
@@ -6,6 +6,8 @@ from fastapi import APIRouter, Depends
 from logging import getLogger
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
+from src.config import settings
+from src.analytics.cache import invalidate_user
 from src.db import get_db
 from src.context import get_request_id
 
@@ -30,13 +32,13 @@ async def upload_cost(
     db: AsyncIOMotorDatabase=Depends(get_db),
     request_id: str = Depends(get_request_id)
 ):
-    document = cost.model_dump(mode="json")
-    document["dt"] = cost.dt
+    document = cost.model_dump(mode="python")
     document["user_name"] = user_name
 
     collection = db["cost"]
     if type(cost) is CostCreate:
         result = await collection.insert_one(document)
+        invalidate_user(user_name)
         cost_id = str(result.inserted_id)
         log.info(
             f"Request ID: [{request_id}] "
@@ -51,6 +53,7 @@ async def upload_cost(
             document,
             upsert=True
         )
+        invalidate_user(user_name)
         if result.upserted_id:
             cost_id = str(result.upserted_id)
         log.info(
@@ -85,6 +88,7 @@ async def delete_cost(
     collection = db["cost"]
 
     result = await collection.delete_one(query)
+    invalidate_user(user_name)
 
     log.info(
         f"Request ID: [{request_id}] "
@@ -107,7 +111,7 @@ async def get_costs(
     query = {"user_name": user_name}
     if from_dt:
         query["dt"] = {"$gte": from_dt}
-    cursor = collection.find(query).sort("dt", int(sort_dt))
-    documents = await cursor.to_list()
+    cursor = collection.find(query).sort("dt", int(sort_dt)).batch_size(settings.mongo_batch_size)
+    documents = await cursor.to_list(length=settings.mongo_max_documents)
 
     return [CostDocument(cost_id=str(_["_id"]), **_) for _ in documents]
@@ -2,7 +2,7 @@ from contextlib import asynccontextmanager
 
 
 from fastapi import Request, FastAPI, HTTPException
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
 from pymongo.errors import CollectionInvalid
 
 from config import settings
@@ -34,6 +34,12 @@ async def collections_init(db: AsyncIOMotorDatabase):
     except CollectionInvalid:
         log.info("Collection 'cost' already exists.")
 
+    # Query indexes for listing and analytics; create_index is a no-op when they exist,
+    # so they are ensured on every startup, not only when the collection is created.
+    for name in ("bill", "cost"):
+        await db[name].create_index([("user_name", 1), ("dt", -1)])
+        await db[name].create_index([("user_name", 1), ("category", 1)])
+
 
 @asynccontextmanager
 async def db_lifespan(app: FastAPI):
@@ -41,6 +47,7 @@ async def db_lifespan(app: FastAPI):
     An async context manager, designed to be passed to FastAPI() as a lifespan.
 
     Initializes a MongoDB client and attaches it to the app
+    together with the GridFS bucket used for image bytes.
     Create collections if they don't exist.
 
     On shutdown, ensures that the database connection is closed appropriately.
@@ -49,6 +56,7 @@ async def db_lifespan(app: FastAPI):
     # Startup
     app.mongodb_client = AsyncIOMotorClient(str(settings.mongo_dsn))
     app.db = app.mongodb_client.get_database(settings.mongo_db_name)
+    app.fs = AsyncIOMotorGridFSBucket(app.db, bucket_name="images")
 
     ping_response = await app.db.command("ping")
     if int(ping_response["ok"]) != 1:
@@ -70,3 +78,10 @@ def get_db(request: Request):
     if db is None:
         raise HTTPException(status_code=500, detail="Database connection is not available")
     return db
+
+
+def get_fs(request: Request):
+    fs = request.app.fs
+    if fs is None:
+        raise HTTPException(status_code=500, detail="Database connection is not available")
+    return fs
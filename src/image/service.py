@@ -1,5 +1,6 @@
 import time
 import functools
+import threading
 
 import numpy as np
 import cv2
@@ -43,20 +44,37 @@ def measure_time(func):
 #     raise QRCodeDecodeError("QRCodeDecodeError")
 
 
+@functools.lru_cache(maxsize=1)
+def get_qreader() -> QReader:
+    # Loading the detector model is expensive, build it once per process.
+    return QReader()
+
+
+# The shared QReader wraps a YOLO model that is not thread-safe,
+# and decodes run in asyncio.to_thread workers.
+qreader_lock = threading.Lock()
+
+
+# Half resolution is usually enough for detection and much cheaper to decode,
+# full resolution is only tried when it finds nothing.
+IMREAD_FLAGS = (cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_COLOR)
+
+
 @measure_time
 def process_qr_url_1(image_bytes: bytes):
     arr = np.frombuffer(image_bytes, np.uint8)
-    image = cv2.imdecode(arr, cv2.IMREAD_COLOR)
 
-    qreader = QReader()
+    for flags in IMREAD_FLAGS:
+        image = cv2.imdecode(arr, flags)
+
+        with qreader_lock:
+            decoded_text = get_qreader().detect_and_decode(image=image)
 
-    decoded_text = qreader.detect_and_decode(image=image)
+        first = next((x for x in decoded_text if x is not None), None)
+        if first is not None:
+            return first
 
-    first = next((x for x in decoded_text if x is not None), None)
-    if first is not None:
-        return first
-    else:
-        raise QRCodeDecodeError("QRCodeDecodeError")
+    raise QRCodeDecodeError("QRCodeDecodeError")
 
 
 if __name__ == "__main__":
@@ -1,12 +1,15 @@
-from typing import List
+import asyncio
+from io import BytesIO
+from typing import List, Tuple
 import hashlib
-from bson import Binary
 
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Response, status
 from logging import getLogger
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from pymongo.errors import DuplicateKeyError
 
-from src.db import get_db
+from src.config import settings
+from src.db import get_db, get_fs
 from src.context import get_request_id
 from src.exceptions import QRCodeDecodeError
 
@@ -18,6 +21,8 @@ log = getLogger(__name__)
 
 router = APIRouter()
 
+IMAGE_READ_CHUNK_SIZE = 64 * 1024
+
 
 @router.get("", response_model=List[str])
 async def get_names(
@@ -26,16 +31,33 @@ async def get_names(
     request_id: str = Depends(get_request_id)
 ):
     collection = db["image"]
-    cursor = collection.find({"user_name": user_name}, {"_id": 0, "image_name": 1})
-    documents = await cursor.to_list()
+    cursor = collection.find({"user_name": user_name}, {"_id": 0, "image_name": 1}).batch_size(settings.mongo_batch_size)
+    documents = await cursor.to_list(length=settings.mongo_max_documents)
     return [_["image_name"] for _ in documents]
 
 
-def get_image_name_from_bytes(image_bytes):
-    return hashlib.md5(image_bytes).hexdigest()
+def _read_and_hash(file) -> Tuple[bytes, str]:
+    # MD5 is kept: image names are persisted content addresses.
+    digest = hashlib.md5()
+    buffer = BytesIO()
+    file.seek(0)
+    while chunk := file.read(IMAGE_READ_CHUNK_SIZE):
+        digest.update(chunk)
+        buffer.write(chunk)
+    return buffer.getvalue(), digest.hexdigest()
+
 
+async def hash_upload(image: UploadFile) -> Tuple[bytes, str]:
+    """
+    Read the upload in chunks, hashing each chunk as it arrives,
+    so the image bytes are traversed once instead of read-then-hashed.
+    Runs in a worker thread: reading an in-memory upload never yields,
+    so hashing it inline would block the event loop.
+    """
+    return await asyncio.to_thread(_read_and_hash, image.file)
 
-async def upload_image_bytes(image_bytes, image_name, user_name, db, request_id):
+
+async def upload_image_bytes(image_bytes, image_name, user_name, db, fs, request_id):
     collection = db["image"]
     document = await collection.find_one(
         {
@@ -45,13 +67,23 @@ async def upload_image_bytes(image_bytes, image_name, user_name, db, request_id)
     )
     if document: return UploadImageResponse(image_name=image_name)
 
-    await collection.insert_one(
-        {
-            "image_name": image_name,
-            "user_name": user_name,
-            "binary": Binary(image_bytes)
-        }
+    file_id = await fs.upload_from_stream(
+        image_name,
+        image_bytes,
+        metadata={"user_name": user_name}
     )
+    try:
+        await collection.insert_one(
+            {
+                "image_name": image_name,
+                "user_name": user_name,
+                "file_id": file_id
+            }
+        )
+    except DuplicateKeyError:
+        # A concurrent upload of the same image won the insert; drop our copy of the bytes.
+        await fs.delete(file_id)
+        return UploadImageResponse(image_name=image_name)
 
     log.info(
         f"Request ID: [{request_id}] "
@@ -67,17 +99,17 @@ async def upload_image(
     image: UploadFile = File(...),
     user_name: str = "unknown",
     db: AsyncIOMotorDatabase=Depends(get_db),
+    fs: AsyncIOMotorGridFSBucket=Depends(get_fs),
     request_id: str = Depends(get_request_id),
 ):
-    image_bytes = await image.read()
-    image_name = get_image_name_from_bytes(image_bytes)
+    image_bytes, image_name = await hash_upload(image)
 
-    return await upload_image_bytes(image_bytes, image_name, user_name, db, request_id)
+    return await upload_image_bytes(image_bytes, image_name, user_name, db, fs, request_id)
 
 
-def qr_decode_by_image_bytes(image_bytes, image_name, request_id):
+async def qr_decode_by_image_bytes(image_bytes, image_name, request_id):
     try:
-        qr_url = process_qr_url_1(image_bytes)
+        qr_url = await asyncio.to_thread(process_qr_url_1, image_bytes)
         log.info(
             f"Request ID: [{request_id}] "
             f"QR code successfully decoded for image_name={image_name}. "
@@ -115,16 +147,16 @@ async def qr_decode_by_image(
     db: AsyncIOMotorDatabase=Depends(get_db),
     request_id: str = Depends(get_request_id)
 ):
-    image_bytes = await image.read()
-    image_name = get_image_name_from_bytes(image_bytes)
+    image_bytes, image_name = await hash_upload(image)
 
-    return qr_decode_by_image_bytes(image_bytes, image_name, request_id)
+    return await qr_decode_by_image_bytes(image_bytes, image_name, request_id)
 
 
 @router.get("/qr/decode-by", response_model=QrUrlResponse)
 async def qr_decode_by_image_name(
     image_name: str,
     db: AsyncIOMotorDatabase=Depends(get_db),
+    fs: AsyncIOMotorGridFSBucket=Depends(get_fs),
     request_id: str = Depends(get_request_id)
 ):
     collection = db["image"]
@@ -132,6 +164,11 @@ async def qr_decode_by_image_name(
     if not document:
         raise HTTPException(status_code=404, detail="Image not found.")
 
-    image_bytes = document["binary"]
+    if "file_id" in document:
+        stream = await fs.open_download_stream(document["file_id"])
+        image_bytes = await stream.read()
+    else:
+        # Images stored before the GridFS migration keep their bytes inline.
+        image_bytes = document["binary"]
 
-    return qr_decode_by_image_bytes(image_bytes, image_name, request_id)
+    return await qr_decode_by_image_bytes(image_bytes, image_name, request_id)
@@ -1,6 +1,7 @@
 from typing import AsyncGenerator
 from contextlib import asynccontextmanager, AsyncExitStack
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
 from src.config import settings
 from src.logging_config import setup_logging
@@ -23,6 +24,7 @@ async def combined_lifespan(app: FastAPI) -> AsyncGenerator:
 app: FastAPI = FastAPI(
     lifespan=combined_lifespan,
     title=settings.project_name,
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(RequestIDMiddleware)
@@ -3,7 +3,11 @@ from src.bill.schemas import GetBillResponse
 
 
 class ProcessingImageResponse(GetBillResponse):
-    ...
+
+    @classmethod
+    def from_bill(cls, bill: GetBillResponse) -> "ProcessingImageResponse":
+        # bill is already validated, so its fields are copied without a dump/validate pass
+        return cls.model_construct(**bill.__dict__)
 
 
 class ProcessingImageNameRequest(RacunBase):
@@ -1,16 +1,18 @@
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Response, status
 import httpx
 from logging import getLogger
-from motor.motor_asyncio import AsyncIOMotorDatabase
-from pydantic import ValidationError
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
 
-from src.db import get_db
+from src.db import get_db, get_fs
 from src.client import get_async_client
 from src.context import get_request_id
-from src.image.views import upload_image, upload_image_bytes, qr_decode_by_image, qr_decode_by_image_name, get_image_name_from_bytes, qr_decode_by_image_bytes
+from src.singleflight import SingleFlight
+from src.image.views import upload_image, upload_image_bytes, qr_decode_by_image, qr_decode_by_image_name, hash_upload, qr_decode_by_image_bytes
 from src.bill.views import upload_bill, get_bill
+from src.bill.service import get_bill_facets
 from src.bill.schemas import UploadBillRequest
-from src.suf_purs.schemas import QrUrlRequest
+from src.image.schemas import QrUrlResponse
+from src.suf_purs.schemas import SpecificationsResponse
 from src.suf_purs.views import processing_qr_url_content
 
 from .schemas import ProcessingImageResponse, ProcessingImageNameRequest
@@ -19,36 +21,51 @@ log = getLogger(__name__)
 
 router = APIRouter()
 
+# Keyed by (user_name, image_name): the same user resubmitting an image while it is
+# still being processed waits for the first run instead of repeating it.
+# One flight per function, since the two do not produce the same outcome for a name.
+image_name_flight = SingleFlight()
+image_bytes_flight = SingleFlight()
+
+
+def _upload_request_from_bill(bill: UploadBillRequest) -> UploadBillRequest:
+    return UploadBillRequest.model_construct(
+        **{name: getattr(bill, name) for name in UploadBillRequest.model_fields}
+    )
+
+
+def _upload_request_from_qr(
+    image_name: str,
+    qr_url_response: QrUrlResponse,
+    specifications_response: SpecificationsResponse
+) -> UploadBillRequest:
+    return UploadBillRequest.model_construct(
+        image_name=image_name,
+        qr_url=qr_url_response.qr_url,
+        dt=specifications_response.dt,
+        items=specifications_response.items,
+        seller_info=specifications_response.seller_info
+    )
+
 
 async def _processing_image_name(
     image_name: str,
     user_name: str,
     db: AsyncIOMotorDatabase,
+    fs: AsyncIOMotorGridFSBucket,
     async_client: httpx.AsyncClient,
     request_id: str
 ) -> ProcessingImageResponse:
-    qr_url_response = await qr_decode_by_image_name(image_name, db, request_id)
-    try:
-        QrUrlRequest.model_validate(qr_url_response.model_dump())
-    except ValidationError:
-        raise HTTPException(
-            status_code=422,
-            detail="Invalid QR URL"
-        )
+    qr_url_response = await qr_decode_by_image_name(image_name, db, fs, request_id)
+    if qr_url_response.qr_url.host != "suf.purs.gov.rs":
+        raise HTTPException(status_code=422, detail="Invalid QR URL")
 
     specifications_response = await processing_qr_url_content(qr_url_response, db, async_client, request_id)
 
-    bill = UploadBillRequest(
-        image_name=image_name,
-        **qr_url_response.model_dump(),
-        **specifications_response.model_dump()
-    )
+    bill = _upload_request_from_qr(image_name, qr_url_response, specifications_response)
     upload_bill_response = await upload_bill(bill, user_name, db, request_id)
 
-    return ProcessingImageResponse(
-        **bill.model_dump(),
-        **upload_bill_response.model_dump()
-    )
+    return ProcessingImageResponse.from_bill(upload_bill_response.bill)
 
 
 @router.post("/processing-image", response_model=ProcessingImageResponse)
@@ -57,6 +74,7 @@ async def processing_image(
     image: UploadFile = File(...),
     user_name: str = "unknown",
     db: AsyncIOMotorDatabase=Depends(get_db),
+    fs: AsyncIOMotorGridFSBucket=Depends(get_fs),
     async_client: httpx.AsyncClient=Depends(get_async_client),
     request_id: str = Depends(get_request_id)
 ):
@@ -66,17 +84,17 @@ async def processing_image(
         f"username: {user_name}"
     )
 
-    upload_image_response = await upload_image(image, user_name, db, request_id)
+    upload_image_response = await upload_image(image, user_name, db, fs, request_id)
     image_name = upload_image_response.image_name
 
     bill = await get_bill(user_name=user_name, image_name=image_name, db=db)
     if bill:
-        return ProcessingImageResponse(
-            image_name=image_name,
-            **bill.model_dump(),
-        )
+        return ProcessingImageResponse.from_bill(bill)
 
-    return await _processing_image_name(image_name, user_name, db, async_client, request_id)
+    return await image_name_flight.run(
+        (user_name, image_name),
+        _processing_image_name, image_name, user_name, db, fs, async_client, request_id
+    )
 
 
 @router.post("/processing-image-name", response_model=ProcessingImageResponse)
@@ -84,6 +102,7 @@ async def processing_image_name(
     pin: ProcessingImageNameRequest,
     user_name: str = "unknown",
     db: AsyncIOMotorDatabase=Depends(get_db),
+    fs: AsyncIOMotorGridFSBucket=Depends(get_fs),
     async_client: httpx.AsyncClient=Depends(get_async_client),
     request_id: str = Depends(get_request_id)
 ):
@@ -93,78 +112,83 @@ async def processing_image_name(
         f"username: {user_name}"
     )
 
-    return await _processing_image_name(pin.image_name, user_name, db, async_client, request_id)
+    return await image_name_flight.run(
+        (user_name, pin.image_name),
+        _processing_image_name, pin.image_name, user_name, db, fs, async_client, request_id
+    )
 
 
 
-@router.post("/processing", response_model=ProcessingImageResponse)
-async def processing_by_image(
-    image: UploadFile = File(...),
-    user_name: str = "unknown",
-    db: AsyncIOMotorDatabase=Depends(get_db),
-    async_client: httpx.AsyncClient=Depends(get_async_client),
-    request_id: str = Depends(get_request_id)
+async def _processing_image_bytes(
+    image_bytes: bytes,
+    image_name: str,
+    user_name: str,
+    db: AsyncIOMotorDatabase,
+    fs: AsyncIOMotorGridFSBucket,
+    async_client: httpx.AsyncClient,
+    request_id: str
 ):
-    image_bytes = await image.read()
-    image_name = get_image_name_from_bytes(image_bytes)
-
-
-    user_bill = await get_bill(user_name=user_name, image_name=image_name, db=db, request_id=request_id)
-    if user_bill: return user_bill
+    bills = await get_bill_facets(db, user_name, image_name=image_name)
+    if bills["user_image"]: return bills["user_image"]
 
 
-    bill = await get_bill(image_name=image_name, db=db, request_id=request_id)
+    bill = bills["shared_image"]
     if bill:
         user_bill = await get_bill(user_name=user_name, qr_url=str(bill.qr_url), db=db, request_id=request_id)
         if user_bill: return user_bill
 
         upserted_bill = await upload_bill(
-            UploadBillRequest(**bill.model_dump()),
+            _upload_request_from_bill(bill),
             user_name, db, request_id
         )
-        user_bill = await get_bill(bill_id=upserted_bill.upserted_id, db=db, request_id=request_id)
-        return user_bill
+        return upserted_bill.bill
 
 
     try:
-        qr_url_response = qr_decode_by_image_bytes(image_bytes, image_name, request_id)
+        qr_url_response = await qr_decode_by_image_bytes(image_bytes, image_name, request_id)
     except Exception as e:
-        await upload_image_bytes(image_bytes, image_name, user_name, db, request_id)
+        await upload_image_bytes(image_bytes, image_name, user_name, db, fs, request_id)
         log.info(
             f"Request ID: [{request_id}] "
             f"image_name={image_name} saved for future qr decode debug."
         )
         raise e
 
-    try:
-        QrUrlRequest.model_validate(qr_url_response.model_dump())
-    except ValidationError:
+    if qr_url_response.qr_url.host != "suf.purs.gov.rs":
         raise HTTPException(status_code=422, detail="Invalid QR URL")
 
 
-    user_bill = await get_bill(user_name=user_name, qr_url=str(qr_url_response.qr_url), db=db, request_id=request_id)
-    if user_bill: return user_bill
+    bills = await get_bill_facets(db, user_name, qr_url=str(qr_url_response.qr_url))
+    if bills["user_qr"]: return bills["user_qr"]
 
 
-    bill = await get_bill(qr_url=str(qr_url_response.qr_url), db=db, request_id=request_id)
+    bill = bills["shared_qr"]
     if bill:
         upserted_bill = await upload_bill(
-            UploadBillRequest(**bill.model_dump()),
+            _upload_request_from_bill(bill),
             user_name, db, request_id
         )
-        user_bill = await get_bill(bill_id=upserted_bill.upserted_id, db=db, request_id=request_id)
-        return user_bill
+        return upserted_bill.bill
 
 
     specifications_response = await processing_qr_url_content(qr_url_response, db, async_client, request_id)
-    bill = UploadBillRequest(
-        image_name=image_name,
-        **qr_url_response.model_dump(),
-        **specifications_response.model_dump()
-    )
-    upserted_bill = await upload_bill(
-        UploadBillRequest(**bill.model_dump()),
-        user_name, db, request_id
+    bill = _upload_request_from_qr(image_name, qr_url_response, specifications_response)
+    upserted_bill = await upload_bill(bill, user_name, db, request_id)
+    return upserted_bill.bill
+
+
+@router.post("/processing", response_model=ProcessingImageResponse)
+async def processing_by_image(
+    image: UploadFile = File(...),
+    user_name: str = "unknown",
+    db: AsyncIOMotorDatabase=Depends(get_db),
+    fs: AsyncIOMotorGridFSBucket=Depends(get_fs),
+    async_client: httpx.AsyncClient=Depends(get_async_client),
+    request_id: str = Depends(get_request_id)
+):
+    image_bytes, image_name = await hash_upload(image)
+
+    return await image_bytes_flight.run(
+        (user_name, image_name),
+        _processing_image_bytes, image_bytes, image_name, user_name, db, fs, async_client, request_id
     )
-    user_bill = await get_bill(bill_id=upserted_bill.upserted_id, db=db, request_id=request_id)
-    return user_bill
@@ -1,5 +1,5 @@
 import re
-from typing import List
+from typing import Dict, List
 from datetime import datetime
 
 from src.exceptions import ParseContentError
@@ -7,47 +7,69 @@ from .schemas import SpecificationsRequest
 
 
 patterns_map = {
-    "invoice_number": r"viewModel\.InvoiceNumber\('([^']+)'\)",
-    "token": r"viewModel\.Token\('([^']+)'\)",
-    "bill_datetime": r'<span id="sdcDateTimeLabel">\s*([\d\.]+ \d{2}:\d{2}:\d{2})\s*</span>',
-    "bill_meta_info": r"============ ФИСКАЛНИ РАЧУН ============\r\n(.*?)\r\n-------------ПРОМЕТ ПРОДАЈА-------------"
+    "invoice_number": rb"viewModel\.InvoiceNumber\('(?P<invoice_number>[^']+)'\)",
+    "token": rb"viewModel\.Token\('(?P<token>[^']+)'\)",
+    "bill_datetime": rb'<span id="sdcDateTimeLabel">\s*(?P<bill_datetime>[\d\.]+ \d{2}:\d{2}:\d{2})\s*</span>',
 }
 
+# All patterns as one alternation, so the page is scanned once;
+# every alternative has a single named group, reported by match.lastgroup.
+# The patterns are ASCII, so they run on the raw page bytes and only the
+# matched groups are decoded.
+page_pattern = re.compile(b"|".join(patterns_map.values()))
 
-def parse_content(pattern: str, content: bytes):
-    match = re.search(pattern, content.decode("utf-8"), re.S)
-    if match:
-        return match.group(1)
-    else:
-        raise ParseContentError(f"pattern {pattern} not found")
+# The meta info block sits between fixed literals, so two bytes.find calls
+# locate it without a DOTALL regex.
+META_INFO_START = "============ ФИСКАЛНИ РАЧУН ============\r\n".encode("utf-8")
+META_INFO_END = "\r\n-------------ПРОМЕТ ПРОДАЈА-------------".encode("utf-8")
 
 
-def get_specifications_request(content: bytes) -> SpecificationsRequest:
-    try:
-        invoice_number = parse_content(patterns_map["invoice_number"], content)
-    except ParseContentError:
-        raise ParseContentError(f"pattern 'invoice_number' not found")
-    try:
-        token = parse_content(patterns_map["token"], content)
-    except ParseContentError:
-        raise ParseContentError(f"pattern 'token' not found")
+def parse_content(content: bytes) -> Dict[str, str]:
+    parsed = {}
+    for match in page_pattern.finditer(content):
+        if match.lastgroup not in parsed:
+            parsed[match.lastgroup] = match.group(match.lastgroup).decode("utf-8", errors="replace")
+            if len(parsed) == len(patterns_map):
+                break
 
-    return SpecificationsRequest(invoiceNumber=invoice_number, token=token)
+    for name in patterns_map:
+        if name not in parsed:
+            raise ParseContentError(f"pattern '{name}' not found")
 
+    meta_info = find_meta_info(content)
+    if meta_info is None:
+        raise ParseContentError("pattern 'bill_meta_info' not found")
+    parsed["bill_meta_info"] = meta_info
 
-def get_dt(content: bytes) -> datetime:
-    try:
-        dt = parse_content(patterns_map["bill_datetime"], content)
-    except ParseContentError:
-        raise ParseContentError(f"pattern 'bill_datetime' not found")
+    return parsed
 
-    return datetime.strptime(dt, '%d.%m.%Y. %H:%M:%S')
 
+def find_meta_info(content: bytes) -> str | None:
+    start = content.find(META_INFO_START)
+    if start == -1:
+        return None
+    start += len(META_INFO_START)
+    end = content.find(META_INFO_END, start)
+    if end == -1:
+        return None
+    return content[start:end].decode("utf-8", errors="replace")
 
-def get_meta_info(content: bytes) -> List[str]:
-    try:
-        meta_info = parse_content(patterns_map["bill_meta_info"], content)
-    except ParseContentError:
-        raise ParseContentError(f"pattern 'bill_meta_info' not found")
 
-    return [_.strip() for _ in meta_info.split("\r\n")]
\ No newline at end of file
+def get_specifications_request(parsed: Dict[str, str]) -> SpecificationsRequest:
+    return SpecificationsRequest(invoiceNumber=parsed["invoice_number"], token=parsed["token"])
+
+
+def get_dt(parsed: Dict[str, str]) -> datetime:
+    value = parsed["bill_datetime"]
+    # Receipts normally print the zero-padded "dd.mm.yyyy. HH:MM:SS", which is
+    # sliced directly; anything else goes through the slower strptime.
+    if len(value) == 20 and value[2] == value[5] == ".":
+        return datetime(
+            int(value[6:10]), int(value[3:5]), int(value[0:2]),
+            int(value[12:14]), int(value[15:17]), int(value[18:20])
+        )
+    return datetime.strptime(value, '%d.%m.%Y. %H:%M:%S')
+
+
+def get_meta_info(parsed: Dict[str, str]) -> List[str]:
+    return [_.strip() for _ in parsed["bill_meta_info"].split("\r\n")]
@@ -4,14 +4,19 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException
 import httpx
 from httpx import HTTPStatusError
+import orjson
 
+from cachetools import TTLCache
+from pydantic import TypeAdapter
 from logging import getLogger
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
+from src.config import settings
 from src.db import get_db
 from src.client import get_async_client
 from src.context import get_request_id
 from src.exceptions import ParseContentError
+from src.singleflight import SingleFlight
 
 from .schemas import (
     QrUrlRequest,
@@ -21,6 +26,7 @@ from .schemas import (
     SpecificationsResponse
 )
 from .service import (
+    parse_content,
     get_specifications_request,
     get_dt,
     get_meta_info
@@ -32,30 +38,48 @@ log = getLogger(__name__)
 router = APIRouter()
 
 
-@router.post("/processing", response_model=SpecificationsResponse)
-async def processing_qr_url_content(
-    qur: QrUrlRequest,
-    db: AsyncIOMotorDatabase=Depends(get_db),
-    async_client: httpx.AsyncClient=Depends(get_async_client),
-    request_id: str = Depends(get_request_id)
-):
+# A fiscal receipt never changes once issued, so its specifications
+# can be reused for any image that decodes to the same QR URL.
+specifications_cache = TTLCache(
+    maxsize=settings.specifications_cache_size,
+    ttl=settings.specifications_cache_ttl
+)
+# Receipt pages that could not be parsed, keyed by QR URL with the error detail,
+# so retries of a bad receipt are answered without hitting suf.purs again.
+failed_specifications_cache = TTLCache(
+    maxsize=settings.specifications_cache_size,
+    ttl=settings.specifications_negative_cache_ttl
+)
+specifications_flight = SingleFlight()
+
+# The meta info lines of a receipt come in SellerInfo field order.
+SELLER_FIELDS = tuple(SellerInfo.model_fields)
+
+# Validates the whole /specifications item list in a single pydantic-core call.
+SPECIFICATION_ITEMS_ADAPTER = TypeAdapter(List[SpecificationItem])
+
+
+async def _fetch_specifications(
+    qr_url: str,
+    async_client: httpx.AsyncClient,
+    request_id: str
+) -> SpecificationsResponse:
     try:
-        response = await async_client.get(str(qur.qr_url))
+        response = await async_client.get(qr_url)
         response.raise_for_status()
     except HTTPStatusError as http_exc:
         raise HTTPException(
             status_code=http_exc.response.status_code,
-            detail=f"GET {str(qur.qr_url)} request error"
+            detail=f"GET {qr_url} request error"
         )
 
-    content = response.content
-
-    try:
-        sr: SpecificationsRequest = get_specifications_request(content)
-        dt: datetime = get_dt(content)
-        meta_info: List[str] = get_meta_info(content)
-    except ParseContentError as e:
-        raise HTTPException(status_code=422, detail=str(e))
+    # ParseContentError propagates: _load_specifications caches it as a bad receipt.
+    parsed = parse_content(response.content)
+    sr: SpecificationsRequest = get_specifications_request(parsed)
+    dt: datetime = get_dt(parsed)
+    meta_info: List[str] = get_meta_info(parsed)
+    if len(meta_info) < len(SELLER_FIELDS):
+        raise ParseContentError("bill meta info is incomplete")
 
     specifications_url = 'https://suf.purs.gov.rs/specifications'
     try:
@@ -69,21 +93,66 @@ async def processing_qr_url_content(
             status_code=http_exc.response.status_code,
             detail=f"POST {specifications_url} request error"
         )
-    data = response.json()
+    data = orjson.loads(response.content)
     items = []
     success = data.get("success", False)
     if success:
         items = data.get("items", [])
-        items = [SpecificationItem(**_) for _ in items]
+        items = SPECIFICATION_ITEMS_ADAPTER.validate_python(items)
 
     log.info(
         f"Request ID: [{request_id}] "
         f"specifications successfully processed"
     )
 
-    fields = SellerInfo.__annotations__.keys()
     return SpecificationsResponse(
         dt=dt,
         items=items,
-        seller_info=SellerInfo(**dict(zip(fields, meta_info)))
+        seller_info=SellerInfo.model_construct(**dict(zip(SELLER_FIELDS, meta_info)))
     )
+
+
+async def _load_specifications(
+    qr_url: str,
+    async_client: httpx.AsyncClient,
+    request_id: str
+) -> SpecificationsResponse:
+    try:
+        specifications = await _fetch_specifications(qr_url, async_client, request_id)
+    except ParseContentError as e:
+        # Only an unparseable page is a property of the receipt itself;
+        # upstream HTTP errors may be transient and are not cached.
+        failed_specifications_cache[qr_url] = str(e)
+        raise HTTPException(status_code=422, detail=str(e))
+    # An empty item list usually means /specifications answered success=false,
+    # which may be transient, so only complete results are kept.
+    if specifications.items:
+        specifications_cache[qr_url] = specifications
+    return specifications
+
+
+@router.post("/processing", response_model=SpecificationsResponse)
+async def processing_qr_url_content(
+    qur: QrUrlRequest,
+    db: AsyncIOMotorDatabase=Depends(get_db),
+    async_client: httpx.AsyncClient=Depends(get_async_client),
+    request_id: str = Depends(get_request_id)
+):
+    qr_url = str(qur.qr_url)
+    specifications = specifications_cache.get(qr_url)
+    if specifications is not None:
+        log.info(
+            f"Request ID: [{request_id}] "
+            f"specifications taken from cache"
+        )
+        return specifications
+
+    detail = failed_specifications_cache.get(qr_url)
+    if detail is not None:
+        log.info(
+            f"Request ID: [{request_id}] "
+            f"specifications failure taken from cache"
+        )
+        raise HTTPException(status_code=422, detail=detail)
+
+    return await specifications_flight.run(qr_url, _load_specifications, qr_url, async_client, request_id)
@@ -1,3 +1,4 @@
+from pydantic import PositiveInt
 from pydantic_settings import BaseSettings
 
 
@@ -11,6 +12,25 @@ class Settings(BaseSettings):
 
 
     request_timeout: int = 600
+    # Retried GETs are plain reads; a short timeout keeps retries from multiplying request_timeout
+    get_request_timeout: float = 30.0
+    max_concurrent_backend_requests: int = 64
+    backend_retry_attempts: PositiveInt = 3  # total tries, so at least one request is made
+    backend_retry_backoff: float = 0.3  # seconds, doubled per attempt
+
+    api_cache_ttl: float = 60.0
+    api_cache_size: int = 512
+
+    # Telegram Bot API pools: outbound calls and getUpdates long polling are kept
+    # separate, so busy handlers cannot starve polling and vice versa.
+    connection_pool_size: int = 32
+    pool_timeout: float = 10.0
+    get_updates_connection_pool_size: int = 4
+    get_updates_pool_timeout: float = 60.0
+    connect_timeout: float = 10.0
+    read_timeout: float = 30.0
+    # Telegram flood control: RetryAfter responses are retried this many times
+    rate_limiter_max_retries: int = 2
 
     class Config:
         env_file = "../bot.env"
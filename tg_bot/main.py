@@ -1,18 +1,30 @@
+import asyncio
+import heapq
+import html
+import random
 from datetime import datetime
+from functools import lru_cache, wraps
+from operator import attrgetter
 from typing import List, Optional, Dict, Any
 from io import BytesIO
+from logging import getLogger
 
 import httpx
-from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext, CallbackQueryHandler
+from cachetools import TTLCache
+from telegram import Message, Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import AIORateLimiter, Application, CommandHandler, MessageHandler, filters, CallbackContext, CallbackQueryHandler
 
 from src.analytics.schemas import CompanyTotal, ItemTotal, GetAnalyticsResponse, ByCategoriesResponse
 from src.bill.schemas import UploadBillRequest, UploadBillResponse, GetBillResponse
 from src.suf_purs.schemas import SpecificationItem
 from src.pipeline.schemas import ProcessingImageResponse
 from src.cost.schemas import CostItem, CostSellerInfo, CostCreate, CostUpdate, CostDocument
+from src.singleflight import SingleFlight
 from tg_bot.config import settings
-from tg_bot.service import parse_line
+from tg_bot.service import parse_line, day_start, month_start, year_start
+
+
+log = getLogger(__name__)
 
 
 class Config:
@@ -21,18 +33,68 @@ class Config:
     REQUEST_TIMEOUT = settings.request_timeout  # seconds
 
 
+# Callback data fields are joined with "|", which never occurs in categories or ids;
+# buttons sent before the switch still carry "_"-joined data.
+CALLBACK_SEP = "|"
+
+
+def split_callback_data(data: str, maxsplit: int = -1) -> List[str]:
+    sep = CALLBACK_SEP if CALLBACK_SEP in data else "_"
+    return data.split(sep, maxsplit)
+
+
+# Characters a cost entry ("20", "1.200,50 shop", '"20"') can start with
+COST_LEADING_CHARS = frozenset('0123456789+-.,"')
+
+
+# Statistics period -> from_dt ("%Y-%m-%d" or None for all time), given datetime.now()
+PERIOD_BUILDERS = {
+    "today": lambda now: day_start(now.year, now.month, now.day),
+    "currentMonth": lambda now: month_start(now.year, now.month),
+    "currentYear": lambda now: year_start(now.year),
+    "allTime": lambda now: None,
+}
+
+
 # Error mapping
-class ErrorMessages:
-    ERROR_MAP = {
-        "Failed to decode QR code: QRCodeDecodeError": "Can't decode QR code",
-        "File already exists in the database.": "Image already received",
-        "Invalid QR URL": "Invalid QR URL",
-        "default": "Unknown error occurred"
-    }
+DEFAULT_ERROR_MESSAGE = "Unknown error occurred"
+ERROR_MAP = {
+    "Failed to decode QR code: QRCodeDecodeError": "Can't decode QR code",
+    "File already exists in the database.": "Image already received",
+    "Invalid QR URL": "Invalid QR URL",
+}
+
+
+def get_error_message(error_key: str) -> str:
+    return ERROR_MAP.get(error_key, DEFAULT_ERROR_MESSAGE)
 
-    @classmethod
-    def get_error_message(cls, error_key: str) -> str:
-        return cls.ERROR_MAP.get(error_key, cls.ERROR_MAP["default"])
+
+def describe_error(e: Exception) -> str:
+    if isinstance(e, httpx.HTTPStatusError):
+        try:
+            error_key = e.response.json().get("detail")
+        except (ValueError, AttributeError):
+            error_key = None
+        # FastAPI validation errors carry a list as detail
+        if not isinstance(error_key, str):
+            return DEFAULT_ERROR_MESSAGE
+        return get_error_message(error_key)
+    # Replies are sent with parse_mode="HTML"; a raw "<" or "&" would make Telegram reject them
+    return f"An error occurred: {html.escape(str(e))}"
+
+
+def reply_errors(handler):
+    """
+    Report a failed handler to the user as a reply to the triggering message.
+    """
+    @wraps(handler)
+    async def wrapper(self, update: Update, context: CallbackContext):
+        try:
+            return await handler(self, update, context)
+        except Exception as e:
+            log.exception(f"Handler {handler.__name__} failed")
+            await update.effective_message.reply_text(describe_error(e), parse_mode="HTML")
+    return wrapper
 
 
 class KeyboardLayouts:
@@ -53,25 +115,70 @@ class KeyboardLayouts:
         "🚫 Cancel"
     ]
 
+    # Static inline menus are built once; Telegram objects are immutable, so they are shared safely
+    STATISTICS_MENU = InlineKeyboardMarkup([
+        [InlineKeyboardButton("By Categories", callback_data="statistics|byCategories")],
+        [InlineKeyboardButton("By Bills", callback_data="statistics|byBills")],
+        [InlineKeyboardButton("Cancel", callback_data="statistics|cancel")],
+    ])
+    PERIOD_MENUS = {
+        handle: InlineKeyboardMarkup([
+            [InlineKeyboardButton(label, callback_data=f"{handle}|{period}")]
+            for label, period in (
+                ("Today", "today"),
+                ("This Month", "currentMonth"),
+                ("This Year", "currentYear"),
+                ("Overall", "allTime"),
+                ("Cancel", "cancel"),
+            )
+        ])
+        for handle in ("statistics|byCategories", "statistics|byBills")
+    }
+
     categories_map = {_.split(" ", 1)[1]: _ for _ in categories}
+    # (button label, category w/o emoji) pairs for the category keyboard
+    category_choices = tuple((label, category) for category, label in categories_map.items())
 
     @staticmethod
     def get_category_keyboard(handle: str, for_item: str) -> List:
         """
         handle | category | for_item
-        setCategory_Grocery_forCost_67c99e7414606964687e7c26
-        setCategory_Grocery_forBill_67c956c76f72582f61c62ef0
+        setCategory|Grocery|forCost|67c99e7414606964687e7c26
+        setCategory|Grocery|forBill|67c956c76f72582f61c62ef0
         """
-        keyboard = []
-        for category in KeyboardLayouts.categories:
-            parts =  category.split()
-            category_str = " ".join(parts[1:])  # w/o emoji
-            keyboard.append([InlineKeyboardButton(category, callback_data=f"{handle}_{category_str}_{for_item}")])
-
-        return keyboard
+        return [
+            [InlineKeyboardButton(label, callback_data=f"{handle}|{category}|{for_item}")]
+            for label, category in KeyboardLayouts.category_choices
+        ]
 
 
 # Message formatters
+_TOTAL = attrgetter("total")
+
+
+def day_label(dt: datetime, fmt: str) -> str:
+    # Day of month without zero padding, portable unlike glibc's "%-d"
+    return f"{dt.day} {dt.strftime(fmt)}"
+
+
+@lru_cache(maxsize=1024)
+def period_suffix(period: str, from_dt: str | None) -> str:
+    """
+    Text after the total in a statistics header; only the requested period is formatted.
+    """
+    if period == "allTime":
+        return " spent overall"
+
+    dt = datetime.strptime(from_dt, '%Y-%m-%d') if from_dt else None
+    if period == "today":
+        return f" spent today ({day_label(dt, '%B %a') if dt else ''})"
+    if period == "currentMonth":
+        return f" spent this month ({dt.strftime('%B') if dt else ''})"
+    if period == "currentYear":
+        return f" spent this year ({dt.strftime('%Y') if dt else ''})"
+    raise KeyError(period)
+
+
 class MessageFormatter:
     @staticmethod
     def format_top_items_section(title: str, items: List[CompanyTotal | ItemTotal | SpecificationItem], numbers=None):
@@ -82,201 +189,303 @@ class MessageFormatter:
             f"🔥 <b>Top {title} out of {len(items)}</b>",
             *[
                 f"{number} <b>{item.name} — {int(item.total)}</b> <b>RSD</b>"
-                for item, number in zip(items[:len(numbers)], numbers)
+                for item, number in zip(items, numbers)
             ]
         ]
 
     @staticmethod
     def format_bill_response(bill: GetBillResponse) -> str:
-        total = 0.0
-        if len(bill.items) > 0:
-            total = sum([_.total for _ in bill.items])
+        total = sum(map(_TOTAL, bill.items))
         total_s = f"{int(total):,}".replace(",", ".")
         total_s = f"<b>{total_s} RSD</b>"
 
-        header_section = f"{total_s} spent on <b>{bill.seller_info.company}</b> ({bill.dt.strftime('%-d %B %a %H:%M')})"
+        header_section = f"{total_s} spent on <b>{bill.seller_info.company}</b> ({day_label(bill.dt, '%B %a %H:%M')})"
         category_section = KeyboardLayouts.categories_map.get(bill.category, '')
         qr_url = f'👉 <a href="{str(bill.qr_url)}">račun</a>'
 
-        items = sorted(bill.items, key=lambda x: x.total, reverse=True)
-        items_section = [f"🔥 <b>Top items out of {len(items)}</b>"]
-        for item in items[:5]:
+        inv_total = 1e2/total if total else 0.0
+        items = heapq.nlargest(5, bill.items, key=_TOTAL)
+        items_section = [f"🔥 <b>Top items out of {len(bill.items)}</b>"]
+        for item in items:
             total_s = f"{int(item.total):,}".replace(",", ".")
-            rate = int(round(1e2*item.total/total))
+            rate = int(round(item.total*inv_total))
             s = f"<b>{total_s} ({rate}%)</b> — {item.name}"
             items_section.append(s)
 
-        return "\n".join([header_section, category_section, qr_url, "", *items_section])
+        items_str = "\n".join(items_section)
+        return f"{header_section}\n{category_section}\n{qr_url}\n\n{items_str}"
 
     @staticmethod
     def format_cost_response(cost: CostDocument) -> str:
-        total = 0.0
-        if len(cost.items) > 0:
-            total = sum([_.total for _ in cost.items])
+        total = sum(map(_TOTAL, cost.items))
         total_s = f"{int(total):,}".replace(",", ".")
         total_s = f"<b>{total_s} RSD</b>"
 
-        header_section = f"{total_s} spent on <b>{cost.seller_info.company}</b> ({cost.dt.strftime('%-d %B %a')})"
+        header_section = f"{total_s} spent on <b>{cost.seller_info.company}</b> ({day_label(cost.dt, '%B %a')})"
         category_section = KeyboardLayouts.categories_map.get(cost.category, '')
 
-        return "\n".join([header_section, category_section])
+        return f"{header_section}\n{category_section}"
+
+    @staticmethod
+    def format_period_header(total_s: str, period: str, from_dt: str | None) -> str:
+        return f"{total_s}{period_suffix(period, from_dt)}"
 
     @staticmethod
     def format_analytics_by_categories(data: ByCategoriesResponse, period: str, from_dt: str | None) -> str:
         total_s = f"{int(data.total):,}".replace(",", ".")
         total_s = f"<b>{total_s} RSD</b>"
-        period_map = {
-            "today": f"{total_s} spent today ({datetime.strptime(from_dt, '%Y-%m-%d').strftime('%-d %B %a') if from_dt else ''})",
-            "currentMonth": f"{total_s} spent this month ({datetime.strptime(from_dt, '%Y-%m-%d').strftime('%B')  if from_dt else ''})",
-            "currentYear": f"{total_s} spent this year ({datetime.strptime(from_dt, '%Y-%m-%d').strftime('%Y')  if from_dt else ''})",
-            "allTime": f"{total_s} spent overall"
-        }
-        header_section = period_map[period]
+        header_section = MessageFormatter.format_period_header(total_s, period, from_dt)
+        inv_total = 1e2/data.total if data.total else 0.0
         categories_section = []
         for category in data.categories:
             total_s = f"{int(category.total):,}".replace(",", ".")
-            rate = int(round(1e2*category.total/data.total))
+            rate = int(round(category.total*inv_total))
             s = f"<b>{total_s} ({rate}%)</b> — {KeyboardLayouts.categories_map.get(category.category, '')}"
             categories_section.append(s)
 
-        return "\n".join([header_section, "", *categories_section])
+        categories_str = "\n".join(categories_section)
+        return f"{header_section}\n\n{categories_str}"
 
     @staticmethod
     def format_analytics_by_bills(data: GetAnalyticsResponse, period: str, from_dt: str | None) -> str:
         total_s = f"{int(data.total):,}".replace(",", ".")
         total_s = f"<b>{total_s} RSD</b>"
-        period_map = {
-            "today": f"{total_s} spent today ({datetime.strptime(from_dt, '%Y-%m-%d').strftime('%-d %B %a') if from_dt else ''})",
-            "currentMonth": f"{total_s} spent this month ({datetime.strptime(from_dt, '%Y-%m-%d').strftime('%B')  if from_dt else ''})",
-            "currentYear": f"{total_s} spent this year ({datetime.strptime(from_dt, '%Y-%m-%d').strftime('%Y')  if from_dt else ''})",
-            "allTime": f"{total_s} spent overall"
-        }
-        header_section = period_map[period]
+        header_section = MessageFormatter.format_period_header(total_s, period, from_dt)
+        inv_total = 1e2/data.total if data.total else 0.0
 
-        companies = sorted(data.companies, key=lambda x: x.total, reverse=True)
-        companies_section = [f"🔥 <b>Top companies out of {len(companies)}</b>"]
-        for company in companies[:5]:
+        # Only the top five are shown, so select them instead of sorting everything
+        companies = heapq.nlargest(5, data.companies, key=_TOTAL)
+        companies_section = [f"🔥 <b>Top companies out of {len(data.companies)}</b>"]
+        for company in companies:
             total_s = f"{int(company.total):,}".replace(",", ".")
-            rate = int(round(1e2*company.total/data.total))
+            rate = int(round(company.total*inv_total))
             s = f"<b>{total_s} ({rate}%)</b> — {company.name}"
             companies_section.append(s)
 
-        items = sorted(data.items, key=lambda x: x.total, reverse=True)
-        items_section = [f"🔥 <b>Top items out of {len(items)}</b>"]
-        for item in items[:5]:
+        items = heapq.nlargest(5, data.items, key=_TOTAL)
+        items_section = [f"🔥 <b>Top items out of {len(data.items)}</b>"]
+        for item in items:
             total_s = f"{int(item.total):,}".replace(",", ".")
-            rate = int(round(1e2*item.total/data.total))
+            rate = int(round(item.total*inv_total))
             s = f"<b>{total_s} ({rate}%)</b> — {item.name}"
             items_section.append(s)
 
-        return "\n".join([header_section, "", *companies_section, "", *items_section])
+        companies_str = "\n".join(companies_section)
+        items_str = "\n".join(items_section)
+        return f"{header_section}\n\n{companies_str}\n\n{items_str}"
 
 
 # API Client
+JSON_HEADERS = {"Content-Type": "application/json"}
+# Uploads may be fetched documents (GetBillResponse, CostDocument); only the request fields are sent
+UPLOAD_BILL_FIELDS = frozenset(UploadBillRequest.model_fields)
+UPLOAD_COST_FIELDS = frozenset(CostUpdate.model_fields)
+RETRY_METHODS = frozenset({"GET"})
+RETRY_EXCEPTIONS = (httpx.TimeoutException, httpx.RemoteProtocolError, httpx.ConnectError)
+PRE_SEND_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
 class APIClient:
     def __init__(self):
         self.base_url = Config.API_BASE_URL
         self.timeout = httpx.Timeout(Config.REQUEST_TIMEOUT)
+        self.get_timeout = httpx.Timeout(settings.get_request_timeout)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30.0)
+        )
+
+        # Caps in-flight backend requests across all handlers
+        self._semaphore = asyncio.Semaphore(settings.max_concurrent_backend_requests)
+
+        # Short-lived read caches: bills by bill_id, costs by cost_id, analytics by (endpoint, user_name, from_dt).
+        # Writes made through this client invalidate the affected entries.
+        self._bill_cache = TTLCache(maxsize=settings.api_cache_size, ttl=settings.api_cache_ttl)
+        self._cost_cache = TTLCache(maxsize=settings.api_cache_size, ttl=settings.api_cache_ttl)
+        # Concurrent fetches of the same bill or cost share one request
+        self._flight = SingleFlight()
+        self._analytics_cache = TTLCache(maxsize=settings.api_cache_size, ttl=settings.api_cache_ttl)
+        # Bumped by writes, keyed by ("user", user_name), ("bill", bill_id) or ("cost", cost_id);
+        # a fetch that overlapped a write does not store its now stale result.
+        self._generations = {}
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def _generation(self, key) -> int:
+        return self._generations.get(key, 0)
+
+    def _bump(self, key):
+        self._generations[key] = self._generation(key) + 1
+
+    def _store(self, cache: TTLCache, cache_key, key, generation: int, value):
+        if self._generation(key) == generation:
+            cache[cache_key] = value
+
+    def _invalidate_user(self, user_name: str):
+        self._bump(("user", user_name))
+        for key in [_ for _ in self._analytics_cache.keys() if _[1] == user_name]:
+            self._analytics_cache.pop(key, None)
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        # Idempotent reads are retried on any transient failure; writes only when
+        # the request never reached the backend, as a repeated POST could process an image twice
+        idempotent = method in RETRY_METHODS
+        retry_exceptions = RETRY_EXCEPTIONS if idempotent else PRE_SEND_EXCEPTIONS
+        if idempotent:
+            kwargs.setdefault("timeout", self.get_timeout)
+        attempts = settings.backend_retry_attempts
+        for attempt in range(attempts):
+            try:
+                async with self._semaphore:
+                    response = await self._client.request(method, url, **kwargs)
+                if not idempotent or response.status_code < 500 or attempt == attempts - 1:
+                    break
+            except retry_exceptions:
+                if attempt == attempts - 1:
+                    raise
+            # Jittered exponential backoff, slept outside the semaphore
+            await asyncio.sleep(settings.backend_retry_backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+        response.raise_for_status()
+        return response
 
 
     async def process_image(self, image_bytes: BytesIO, username: str) -> ProcessingImageResponse:
         files = {"image": ("image.jpg", image_bytes, "image/jpeg")}
         params = {"user_name": username}
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(
-                f"{self.base_url}/pipeline/processing",
-                files=files,
-                params=params
-            )
-            response.raise_for_status()
-            return ProcessingImageResponse.model_validate(response.json())
+        response = await self._request(
+            "POST",
+            "/pipeline/processing",
+            files=files,
+            params=params
+        )
+        self._invalidate_user(username)
+        return ProcessingImageResponse.model_validate_json(response.content)
 
 
     async def get_bill(self, bill_id: str) -> GetBillResponse:
+        bill = self._bill_cache.get(bill_id)
+        if bill is not None:
+            return bill
+        return await self._flight.run(("bill", bill_id), self._fetch_bill, bill_id)
+
+    async def _fetch_bill(self, bill_id: str) -> GetBillResponse:
         params = {"bill_id": bill_id}
+        generation = self._generation(("bill", bill_id))
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.get(f"{self.base_url}/bill/one", params=params)
-            response.raise_for_status()
-            return GetBillResponse.model_validate(response.json())
+        response = await self._request("GET", "/bill/one", params=params)
+        bill = GetBillResponse.model_validate_json(response.content)
+        self._store(self._bill_cache, bill_id, ("bill", bill_id), generation, bill)
+        return bill
 
 
     async def delete_bill(self, bill_id: str, user_name: str) -> int:
         params = {"bill_id": bill_id, "user_name": user_name}
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.delete(f"{self.base_url}/bill/one", params=params)
-            response.raise_for_status()
-            return response.json()
+        response = await self._request("DELETE", "/bill/one", params=params)
+        self._bump(("bill", bill_id))
+        self._bill_cache.pop(bill_id, None)
+        self._invalidate_user(user_name)
+        return response.json()
 
     async def upload_bill(self, bill_upload: UploadBillRequest, user_name: str) -> UploadBillResponse:
         params = {"user_name": user_name}
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(f"{self.base_url}/bill/upload", params=params, json=bill_upload.model_dump(mode="json"))
-            response.raise_for_status()
-            return UploadBillResponse.model_validate(response.json())
+        response = await self._request("POST", "/bill/upload", params=params, content=bill_upload.model_dump_json(include=UPLOAD_BILL_FIELDS), headers=JSON_HEADERS)
+        upload_response = UploadBillResponse.model_validate_json(response.content)
+        if upload_response.bill is not None:
+            self._bump(("bill", upload_response.bill.bill_id))
+            self._bill_cache[upload_response.bill.bill_id] = upload_response.bill
+        self._invalidate_user(user_name)
+        return upload_response
 
 
     async def get_bill_details(self, bill_id: str) -> GetAnalyticsResponse:
         params = {"bill_id": bill_id}
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.get(f"{self.base_url}/analytics", params=params)
-            response.raise_for_status()
-            return GetAnalyticsResponse.model_validate(response.json())
+        response = await self._request("GET", "/analytics", params=params)
+        return GetAnalyticsResponse.model_validate_json(response.content)
 
     async def get_cost(self, cost_id: str) -> CostDocument:
+        cost = self._cost_cache.get(cost_id)
+        if cost is not None:
+            return cost
+        return await self._flight.run(("cost", cost_id), self._fetch_cost, cost_id)
+
+    async def _fetch_cost(self, cost_id: str) -> CostDocument:
         params = {"cost_id": cost_id}
+        generation = self._generation(("cost", cost_id))
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.get(f"{self.base_url}/cost/one", params=params)
-            response.raise_for_status()
-            return CostDocument.model_validate(response.json())
+        response = await self._request("GET", "/cost/one", params=params)
+        cost = CostDocument.model_validate_json(response.content)
+        self._store(self._cost_cache, cost_id, ("cost", cost_id), generation, cost)
+        return cost
 
     async def delete_cost(self, cost_id: str, user_name: str) -> int:
         params = {"cost_id": cost_id, "user_name": user_name}
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.delete(f"{self.base_url}/cost/one", params=params)
-            response.raise_for_status()
-            return response.json()
+        response = await self._request("DELETE", "/cost/one", params=params)
+        self._bump(("cost", cost_id))
+        self._cost_cache.pop(cost_id, None)
+        self._invalidate_user(user_name)
+        return response.json()
 
     async def upload_cost(self, cost_upload: CostCreate | CostUpdate, user_name: str) -> CostDocument:
         params = {"user_name": user_name}
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(f"{self.base_url}/cost/upload", params=params, json=cost_upload.model_dump(mode="json"))
-            response.raise_for_status()
-            return CostDocument.model_validate(response.json())
+        response = await self._request("POST", "/cost/upload", params=params, content=cost_upload.model_dump_json(include=UPLOAD_COST_FIELDS), headers=JSON_HEADERS)
+        cost = CostDocument.model_validate_json(response.content)
+        self._bump(("cost", cost.cost_id))
+        self._cost_cache[cost.cost_id] = cost
+        self._invalidate_user(user_name)
+        return cost
 
 
     async def get_analytics(self, username: str, from_dt: Optional[str] = None) -> GetAnalyticsResponse:
+        cache_key = ("analytics", username, from_dt)
+        data = self._analytics_cache.get(cache_key)
+        if data is not None:
+            return data
+
         params = {"user_name": username}
         if from_dt is not None:
             params["from_dt"] = from_dt
+        generation = self._generation(("user", username))
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.get(f"{self.base_url}/analytics", params=params)
-            response.raise_for_status()
-            return GetAnalyticsResponse.model_validate(response.json())
+        response = await self._request("GET", "/analytics", params=params)
+        data = GetAnalyticsResponse.model_validate_json(response.content)
+        self._store(self._analytics_cache, cache_key, ("user", username), generation, data)
+        return data
 
     async def get_analytics_by_categories(self, username: str, from_dt: Optional[str] = None) -> ByCategoriesResponse:
+        cache_key = ("by-categories", username, from_dt)
+        data = self._analytics_cache.get(cache_key)
+        if data is not None:
+            return data
+
         params = {"user_name": username}
         if from_dt is not None:
             params["from_dt"] = from_dt
+        generation = self._generation(("user", username))
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.get(f"{self.base_url}/analytics/by-categories", params=params)
-            response.raise_for_status()
-            return ByCategoriesResponse.model_validate(response.json())
+        response = await self._request("GET", "/analytics/by-categories", params=params)
+        data = ByCategoriesResponse.model_validate_json(response.content)
+        self._store(self._analytics_cache, cache_key, ("user", username), generation, data)
+        return data
 
 
 # Handler class
 class TelegramHandler:
     def __init__(self):
         self.api_client = APIClient()
+        # statistics option -> (analytics fetcher, message formatter)
+        self.statistics_sources = {
+            "byCategories": (self.api_client.get_analytics_by_categories, MessageFormatter.format_analytics_by_categories),
+            "byBills": (self.api_client.get_analytics, MessageFormatter.format_analytics_by_bills),
+        }
 
 
     @staticmethod
@@ -288,127 +497,75 @@ class TelegramHandler:
 
 
     async def handle_image(self, update: Update, context: CallbackContext) -> None:
+        # Acknowledge at once and finish in the background, editing the placeholder when done
+        placeholder = await update.message.reply_text("⏳ Processing…")
+        context.application.create_task(
+            self.process_image_and_reply(update, context, placeholder),
+            update=update
+        )
+
+    async def process_image_and_reply(self, update: Update, context: CallbackContext, placeholder: Message) -> None:
         try:
             photo = update.message.photo[-1]
             file = await context.bot.get_file(photo.file_id)
-            file_bytes = BytesIO(await file.download_as_bytearray())
+            # Download straight into the buffer that is uploaded, without an intermediate bytearray
+            file_bytes = BytesIO()
+            await file.download_to_memory(out=file_bytes)
+            file_bytes.seek(0)
             username = update.message.from_user.username or "unknown"
 
-            data = await self.api_client.process_image(file_bytes, username)
-            bill_id = data.bill_id
-            bill = await self.api_client.get_bill(bill_id)
+            # /pipeline/processing already responds with the whole stored bill
+            bill = await self.api_client.process_image(file_bytes, username)
+            bill_id = bill.bill_id
             msg = MessageFormatter.format_bill_response(bill)
 
             keyboard = [
-                [InlineKeyboardButton("Change category", callback_data=f"changeCategory_forBill_{bill_id}")],
-                [InlineKeyboardButton("Remove record", callback_data=f"removeRecord_forBill_{bill_id}")]
+                [InlineKeyboardButton("Change category", callback_data=f"changeCategory|forBill|{bill_id}")],
+                [InlineKeyboardButton("Remove record", callback_data=f"removeRecord|forBill|{bill_id}")]
             ]
 
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await update.message.reply_text(msg, parse_mode="HTML", reply_markup=reply_markup)
-        except httpx.HTTPError as e:
-            if hasattr(e, "response") and hasattr(e.response, "json"):
-                error_key = e.response.json().get('detail')
-                msg = ErrorMessages.get_error_message(error_key)
-            else:
-                msg = f"An error occurred: {str(e)}"
-            await update.message.reply_text(msg, parse_mode="HTML")
+            await placeholder.edit_text(msg, parse_mode="HTML", reply_markup=reply_markup)
         except Exception as e:
-            msg = f"An error occurred: {str(e)}"
-            await update.message.reply_text(msg, parse_mode="HTML")
+            log.exception("Image processing failed")
+            await placeholder.edit_text(describe_error(e), parse_mode="HTML")
 
     async def handle_message_statistics(self, update: Update, context: CallbackContext) -> None:
-        keyboard = [
-            [InlineKeyboardButton("By Categories", callback_data=f"statistics_byCategories")],
-            [InlineKeyboardButton("By Bills", callback_data=f"statistics_byBills")],
-            [InlineKeyboardButton("Cancel", callback_data=f"statistics_cancel")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        return await update.message.reply_text("Select an option", parse_mode="HTML", reply_markup=reply_markup)
-
-    async def handle_statistics_ByCategories(self, update: Update, context: CallbackContext):
-        """
-        query.data :
-            statistics_byCategories_today
-            statistics_byCategories_currentMonth
-        """
-        # query.from_user.username
-        query = update.callback_query
-        period = query.data.split("_")[-1]
-
-        datetime_now = datetime.now()
-        from_dt = None
-        if period == "today":
-            from_dt = datetime_now.strftime('%Y-%m-%d')
-        elif period == "currentMonth":
-            from_dt = datetime(year=datetime_now.year, month=datetime_now.month, day=1).strftime('%Y-%m-%d')
-        elif period == "currentYear":
-            from_dt = datetime(year=datetime_now.year, month=1, day=1).strftime('%Y-%m-%d')
-
-        by_categories_data = await self.api_client.get_analytics_by_categories(query.from_user.username, from_dt)
-
-        msg = MessageFormatter.format_analytics_by_categories(by_categories_data, period, from_dt)
-        return await query.message.edit_text(msg, parse_mode="HTML")
-
-    async def handle_statistics_ByBills(self, update: Update, context: CallbackContext):
-        """
-        query.data :
-            statistics_byCategories_today
-            statistics_byCategories_currentMonth
-        """
-        # query.from_user.username
-        query = update.callback_query
-        period = query.data.split("_")[-1]
-
-        datetime_now = datetime.now()
-        from_dt = None
-        if period == "today":
-            from_dt = datetime_now.strftime('%Y-%m-%d')
-        elif period == "currentMonth":
-            from_dt = datetime(year=datetime_now.year, month=datetime_now.month, day=1).strftime('%Y-%m-%d')
-        elif period == "currentYear":
-            from_dt = datetime(year=datetime_now.year, month=1, day=1).strftime('%Y-%m-%d')
-
-        data = await self.api_client.get_analytics(query.from_user.username, from_dt)
-        msg = MessageFormatter.format_analytics_by_bills(data, period, from_dt)
-        return await query.message.edit_text(msg, parse_mode="HTML")
-
+        return await update.message.reply_text("Select an option", parse_mode="HTML", reply_markup=KeyboardLayouts.STATISTICS_MENU)
 
     async def handle_statistics(self, update: Update, context: CallbackContext):
         """
         query.data :
-            statistics_cancel
-            statistics_byCategories
-            statistics_byBills
-            statistics_byCategories_today
-            statistics_byCategories_currentMonth
-            statistics_byBills_previousMonth
-            statistics_byBills_currentYear
-            statistics_byBills_cancel
+            statistics|cancel
+            statistics|byCategories
+            statistics|byBills
+            statistics|byCategories|today
+            statistics|byCategories|currentMonth
+            statistics|byBills|previousMonth
+            statistics|byBills|currentYear
+            statistics|byBills|cancel
         """
         query = update.callback_query
-        _ = query.data.split("_")
+        _ = split_callback_data(query.data)
 
         if _[-1] == "cancel":
             return await query.message.edit_text("Canceled", parse_mode="HTML")
 
-        if len(_) == 2:  # statistics_byCategories | statistics_byBills
-            handle = "_".join(_)
-            keyboard = [
-                [InlineKeyboardButton("Today", callback_data=f"{handle}_today")],
-                [InlineKeyboardButton("This Month", callback_data=f"{handle}_currentMonth")],
-                [InlineKeyboardButton("This Year", callback_data=f"{handle}_currentYear")],
-                [InlineKeyboardButton("Overall", callback_data=f"{handle}_allTime")],
-                [InlineKeyboardButton("Cancel", callback_data=f"{handle}_cancel")],
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+        if len(_) == 2:  # statistics option chosen, no period yet
+            handle = CALLBACK_SEP.join(_)
+            reply_markup = KeyboardLayouts.PERIOD_MENUS.get(handle)
             return await query.message.edit_text("Select a period", parse_mode="HTML", reply_markup=reply_markup)
 
         handle, option, period = _
-        if option == "byCategories":
-            return await self.handle_statistics_ByCategories(update, context)
-        elif option == "byBills":
-            return await self.handle_statistics_ByBills(update, context)
+        source = self.statistics_sources.get(option)
+        if source is None:
+            return
+
+        fetch, format_message = source
+        from_dt = PERIOD_BUILDERS[period](datetime.now())
+        data = await fetch(query.from_user.username, from_dt)
+        msg = format_message(data, period, from_dt)
+        return await query.message.edit_text(msg, parse_mode="HTML")
 
 
     async def handle_message_uploads(self, update: Update, context: CallbackContext) -> None:
@@ -426,6 +583,7 @@ class TelegramHandler:
     async def handle_message_unknown(self, update: Update, context: CallbackContext) -> None:
         return await update.message.reply_text("Unknown command")
 
+    @reply_errors
     async def handle_message(self, update: Update, context: CallbackContext) -> None:
         text = update.message.text.lower()
 
@@ -439,6 +597,11 @@ class TelegramHandler:
         if handler_function:
             return await handler_function(update, context)
 
+        # A cost entry starts with its amount, so other texts are rejected before parsing
+        if text.lstrip()[:1] not in COST_LEADING_CHARS:
+            await update.message.reply_text("Unknown command")
+            return
+
         username = update.message.from_user.username or "unknown"
         total, company, date = parse_line(text)
         if type(total) is not float:
@@ -459,15 +622,16 @@ class TelegramHandler:
         msg = MessageFormatter.format_cost_response(document)
         cost_id = document.cost_id
         keyboard = [
-            [InlineKeyboardButton("Change category", callback_data=f"changeCategory_forCost_{cost_id}")],
-            [InlineKeyboardButton("Remove record", callback_data=f"removeRecord_forCost_{cost_id}")]
+            [InlineKeyboardButton("Change category", callback_data=f"changeCategory|forCost|{cost_id}")],
+            [InlineKeyboardButton("Remove record", callback_data=f"removeRecord|forCost|{cost_id}")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await update.message.reply_text(msg, parse_mode="HTML", reply_markup=reply_markup)
 
     async def handle_changeCategory(self, update: Update, context: CallbackContext):
         query = update.callback_query
-        _, for_item = query.data.split("_", 1)
+        _, item_type, item_id = split_callback_data(query.data)
+        for_item = f"{item_type}{CALLBACK_SEP}{item_id}"
 
         keyboard = KeyboardLayouts.get_category_keyboard(handle="setCategory", for_item=for_item)
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -480,8 +644,8 @@ class TelegramHandler:
         formatted_message = MessageFormatter.format_cost_response(cost_document)
         cost_id = cost_document.cost_id
         keyboard = [
-            [InlineKeyboardButton("Change category", callback_data=f"changeCategory_forCost_{cost_id}")],
-            [InlineKeyboardButton("Remove record", callback_data=f"removeRecord_forCost_{cost_id}")]
+            [InlineKeyboardButton("Change category", callback_data=f"changeCategory|forCost|{cost_id}")],
+            [InlineKeyboardButton("Remove record", callback_data=f"removeRecord|forCost|{cost_id}")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         return await query.message.edit_text(formatted_message, parse_mode="HTML", reply_markup=reply_markup)
@@ -492,8 +656,8 @@ class TelegramHandler:
 
         formatted_message = MessageFormatter.format_bill_response(bill_document)
         keyboard = [
-            [InlineKeyboardButton("Change category", callback_data=f"changeCategory_forBill_{bill_id}")],
-            [InlineKeyboardButton("Remove record", callback_data=f"removeRecord_forBill_{bill_id}")]
+            [InlineKeyboardButton("Change category", callback_data=f"changeCategory|forBill|{bill_id}")],
+            [InlineKeyboardButton("Remove record", callback_data=f"removeRecord|forBill|{bill_id}")]
         ]
 
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -501,34 +665,32 @@ class TelegramHandler:
 
     async def handle_setCategory_forCost(self, update: Update, context: CallbackContext):
         query = update.callback_query
-        handle, category, item_type, item_id = query.data.split("_")
+        handle, category, item_type, item_id = split_callback_data(query.data)
 
         document = await self.api_client.get_cost(item_id)
         if category == "Cancel":
             return await TelegramHandler.edit_cost_details(update, context, document)
 
-        cost_data = document.model_dump()
-        cost_data["category"] = category
-        cost = CostUpdate(**cost_data)
+        # CostDocument is a CostUpdate
+        cost = document.model_copy(update={"category": category})
 
         updated_cost_document = await self.api_client.upload_cost(cost, document.user_name)
         return await TelegramHandler.edit_cost_details(update, context, updated_cost_document)
 
     async def handle_setCategory_forBill(self, update: Update, context: CallbackContext):
         query = update.callback_query
-        handle, category, item_type, item_id = query.data.split("_")
+        handle, category, item_type, item_id = split_callback_data(query.data)
 
         document = await self.api_client.get_bill(item_id)
         if category == "Cancel":
             return await TelegramHandler.edit_bill_details(update, context, document, item_id)
 
-        bill_data = document.model_dump()
-        bill_data["category"] = category
-        bill = UploadBillRequest(**bill_data)
-        await self.api_client.upload_bill(bill, document.user_name)
-        document = await self.api_client.get_bill(item_id)
+        # GetBillResponse is an UploadBillRequest
+        bill = document.model_copy(update={"category": category})
+        # The upload response already carries the stored bill, no need to fetch it again
+        upload_response = await self.api_client.upload_bill(bill, document.user_name)
 
-        return await TelegramHandler.edit_bill_details(update, context, document, item_id)
+        return await TelegramHandler.edit_bill_details(update, context, upload_response.bill, item_id)
 
     async def handle_setCategory(self, update: Update, context: CallbackContext):
         action_handlers = {
@@ -537,13 +699,13 @@ class TelegramHandler:
         }
 
         query = update.callback_query
-        handle, category, item_type, item_id = query.data.split("_")
+        handle, category, item_type, item_id = split_callback_data(query.data)
         handler_function = action_handlers.get(item_type)
         return await handler_function(update, context)
 
     async def handle_removeRecord(self, update: Update, context: CallbackContext):
         query = update.callback_query
-        handle, item_type, item_id = query.data.split("_")
+        handle, item_type, item_id = split_callback_data(query.data)
 
         text_html = query.message.text_html
         if item_type == "forBill":
@@ -553,6 +715,7 @@ class TelegramHandler:
 
         return await query.message.edit_text("Removed\n"+text_html, parse_mode="HTML")
 
+    @reply_errors
     async def handle_button(self, update: Update, context: CallbackContext):
         action_handlers = {
             "changeCategory": self.handle_changeCategory,
@@ -563,14 +726,30 @@ class TelegramHandler:
 
         query = update.callback_query
         await query.answer()
-        handler, *_ = query.data.split("_", 1)
+        handler, *_ = split_callback_data(query.data, 1)
         handler_function = action_handlers.get(handler)
         return await handler_function(update, context)
 
 
 def main():
     handler = TelegramHandler()
-    app = Application.builder().token(Config.TOKEN).build()
+
+    async def post_stop(application: Application) -> None:
+        await handler.api_client.aclose()
+
+    app = (
+        Application.builder()
+        .token(Config.TOKEN)
+        .connection_pool_size(settings.connection_pool_size)
+        .pool_timeout(settings.pool_timeout)
+        .get_updates_connection_pool_size(settings.get_updates_connection_pool_size)
+        .get_updates_pool_timeout(settings.get_updates_pool_timeout)
+        .connect_timeout(settings.connect_timeout)
+        .read_timeout(settings.read_timeout)
+        .rate_limiter(AIORateLimiter(max_retries=settings.rate_limiter_max_retries))
+        .post_stop(post_stop)
+        .build()
+    )
 
     # Register handlers
     app.add_handler(CommandHandler("start", handler.start))
@@ -1,15 +1,23 @@
 import re
+from datetime import datetime
+from functools import lru_cache
+
+
+DATE_RE = re.compile(r"\d{2}-\d{2}-\d{4}")
+# Drops spaces and quotes in one pass
+NUMBER_JUNK = str.maketrans("", "", ' "')
 
 
 def custom_str_to_float(s):
-    s = s.strip().replace(" ", "").replace('"', "")
-    if "," in s and "." in s:
-        if s.rfind(",") > s.rfind("."):
+    s = s.translate(NUMBER_JUNK).strip()
+    # Plain numbers ("20", "10.5") need no rewriting at all
+    if "," in s:
+        if "." not in s:
+            s = s.replace(",", ".")  # "10,11" → "10.11"
+        elif s.rfind(",") > s.rfind("."):
             s = s.replace(".", "").replace(",", ".")  # "100.120,00" → "100120.00"
         else:
             s = s.replace(",", "")  # "100,120.00" → "100120.00"
-    else:
-        s = s.replace(",", ".")
 
     try:
         return float(s)
@@ -23,13 +31,13 @@ def parse_line(line: str):
     total = custom_str_to_float(parts[0])
     date = None
 
-    if len(parts) >= 3 and re.fullmatch(r"\d{2}-\d{2}-\d{4}", parts[-1]):
+    if len(parts) >= 3 and DATE_RE.fullmatch(parts[-1]):
         date = parts[-1]
         company = " ".join(parts[1:-1])  # Всё между total и date — это company
     else:
         company = " ".join(parts[1:])  # Всё после total — это company
 
-    if re.fullmatch(r"\d{2}-\d{2}-\d{4}", company) and date is None:
+    if DATE_RE.fullmatch(company) and date is None:
         company, date = date, company
 
     if company == "":
@@ -38,6 +46,23 @@ def parse_line(line: str):
     return total, company, date
 
 
+# Period boundaries as "%Y-%m-%d" strings; they change at most once a day,
+# so the formatted values are reused across messages.
+@lru_cache(maxsize=8)
+def day_start(year: int, month: int, day: int) -> str:
+    return datetime(year=year, month=month, day=day).strftime('%Y-%m-%d')
+
+
+@lru_cache(maxsize=8)
+def month_start(year: int, month: int) -> str:
+    return datetime(year=year, month=month, day=1).strftime('%Y-%m-%d')
+
+
+@lru_cache(maxsize=8)
+def year_start(year: int) -> str:
+    return datetime(year=year, month=1, day=1).strftime('%Y-%m-%d')
+
+
 
 if __name__ == "__main__":
     assert custom_str_to_float("10") == 10.0